@@ -1,4 +1,5 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from functools import lru_cache
 from typing import Optional
 
 
@@ -8,24 +9,43 @@ class Settings(BaseSettings):
     # MongoDB Configuration
     MONGODB_URL: str = "mongodb://localhost:27017"
     DATABASE_NAME: str = "drinkbuddies"
+    MONGO_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_COMPRESSORS: str = "zstd,zlib"
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 3000
     
     # Redis Configuration
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_POOL_SIZE: int = 100  # Per worker; chat pub/sub holds just one of these
+    REDIS_POOL_TIMEOUT: int = 5  # Seconds to wait for a free connection when the pool is full
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
     
     # JWT Configuration
     SECRET_KEY: str = "your-secret-key-change-this-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Password Hashing Configuration
+    BCRYPT_ROUNDS: int = 12
+    
+    # Upload Configuration
+    UPLOAD_DIR: str = "/app/uploads"
+    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # bytes
+    UPLOAD_CONCURRENCY: int = 8  # uploads written to disk at once per worker
+    
     # Application Configuration
     APP_NAME: str = "DrinkBuddies API"
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = True
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True, frozen=True)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Get the process-wide settings instance (use get_settings.cache_clear() to reload)."""
+    return Settings()
 
 
 # Create a global settings instance
-settings = Settings()
+settings = get_settings()
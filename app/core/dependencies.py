@@ -1,12 +1,90 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from typing import Optional
+import hashlib
+import time
+import orjson
 from app.core.security import decode_access_token
+from app.core import user_cache
+from app.db.redis import RedisClient
 from app.models.user import User
 
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+# Upper bound (seconds) for the per-token user snapshot kept in Redis
+USER_SNAPSHOT_TTL = 60
+
+# Fields never written to the shared Redis snapshot
+SNAPSHOT_EXCLUDE = {"hashed_password"}
+
+
+def _user_from_snapshot(data: dict) -> User:
+    """
+    Rebuild a User from a Redis snapshot.
+    
+    The snapshot leaves out the password hash, so the rebuilt user gets an
+    empty placeholder. Authenticated users are only read and used as links
+    by the routes, never saved back.
+    """
+    return User.model_validate({**data, "hashed_password": ""})
+
+
+async def authenticate_token(token: str) -> Optional[User]:
+    """
+    Resolve a JWT token to its user.
+    
+    The user document is snapshotted in Redis under a hash of the token so
+    that all workers can skip the MongoDB lookup for the token's lifetime.
+    Snapshots carry the user's revision counter and are ignored once
+    invalidate_user_snapshots() has bumped it.
+    
+    Args:
+        token: JWT token string
+        
+    Returns:
+        User object or None if the token is invalid or the user is gone
+    """
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    
+    username: Optional[str] = payload.get("sub")
+    if username is None:
+        return None
+    
+    redis_client = RedisClient.get_client()
+    snapshot_key = f"jwt:{hashlib.sha256(token.encode()).hexdigest()[:32]}"
+    cached, rev = await redis_client.mget(snapshot_key, f"user_rev:{username}")
+    rev = int(rev or 0)
+    
+    if cached:
+        snapshot = orjson.loads(cached)
+        if snapshot["rev"] == rev:
+            return _user_from_snapshot(snapshot["user"])
+    
+    user = await user_cache.get_user_by_username(username, rev)
+    if user is None:
+        return None
+    
+    ttl = min(int(payload["exp"] - time.time()), USER_SNAPSHOT_TTL)
+    if ttl > 0:
+        await redis_client.set(
+            snapshot_key,
+            orjson.dumps({"rev": rev, "user": user.model_dump(mode="json", exclude=SNAPSHOT_EXCLUDE)}),
+            ex=ttl
+        )
+    
+    return user
+
+
+async def invalidate_user_snapshots(username: str) -> None:
+    """Invalidate every cached token snapshot of a user."""
+    user_cache.invalidate(username)
+    redis_client = RedisClient.get_client()
+    await redis_client.incr(f"user_rev:{username}")
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
@@ -28,18 +106,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # Decode token
-    payload = decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    # Extract username from token
-    username: Optional[str] = payload.get("sub")
-    if username is None:
-        raise credentials_exception
-    
-    # Find user in database
-    user = await User.find_one(User.username == username)
+    # Resolve token to user
+    user = await authenticate_token(token)
     if user is None:
         raise credentials_exception
     
@@ -52,24 +120,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     return user
 
 
-async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
-    """
-    Dependency to get current active user.
-    
-    Args:
-        current_user: User from get_current_user dependency
-        
-    Returns:
-        Current active User object
-    """
-    if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
+# get_current_user already rejects inactive users, so the "active" dependency
+# is the same callable and FastAPI resolves a single dependency per request.
+get_current_active_user = get_current_user
 
 
-async def get_optional_user(token: Optional[str] = Depends(OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False))) -> Optional[User]:
+async def get_optional_user(token: Optional[str] = Depends(oauth2_scheme_optional)) -> Optional[User]:
     """
     Dependency to optionally get the current user if token is provided.
     Returns None if no token or invalid token.
@@ -84,15 +140,7 @@ async def get_optional_user(token: Optional[str] = Depends(OAuth2PasswordBearer(
         return None
     
     try:
-        payload = decode_access_token(token)
-        if payload is None:
-            return None
-        
-        username: Optional[str] = payload.get("sub")
-        if username is None:
-            return None
-        
-        user = await User.find_one(User.username == username)
+        user = await authenticate_token(token)
         if user is None or not user.is_active:
             return None
         
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 
 
 # Post schemas
@@ -51,6 +51,11 @@ class CommentResponse(BaseModel):
         from_attributes = True
 
 
+# List adapters, built once at import, for serializing cached pages
+post_list_adapter = TypeAdapter(List[PostResponse])
+comment_list_adapter = TypeAdapter(List[CommentResponse])
+
+
 # Message schemas
 class MessageCreate(BaseModel):
     """Schema for creating a chat message."""
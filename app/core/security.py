@@ -1,26 +1,43 @@
-from passlib.context import CryptContext
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
+import bcrypt
+from datetime import timedelta
+import jwt
+from jwt import InvalidTokenError
 from typing import Optional
+from cachetools import TLRUCache
+import hashlib
+import time
 from app.core.config import settings
 
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Verified token payloads keyed by a truncated SHA-256 of the token.
+# Entries live at most 30 seconds and never past the token's own expiry;
+# invalid tokens are remembered briefly as None.
+_JWT_CACHE_TTL = 30
+_JWT_INVALID_TTL = 5
+
+
+def _jwt_cache_ttu(key: bytes, payload: Optional[dict], now: float) -> float:
+    """Compute the expiration time of a cached token payload."""
+    if payload is None:
+        return now + _JWT_INVALID_TTL
+    remaining = payload.get("exp", 0) - time.time()
+    return now + max(0, min(_JWT_CACHE_TTL, remaining))
+
+
+_jwt_cache = TLRUCache(maxsize=10000, ttu=_jwt_cache_ttu)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password."""
-    # Truncate password to 72 bytes for bcrypt compatibility
-    truncated_password = plain_password[:72] if len(plain_password.encode('utf-8')) > 72 else plain_password
-    return pwd_context.verify(truncated_password, hashed_password)
+    # bcrypt only uses the first 72 bytes of the secret
+    return bcrypt.checkpw(plain_password.encode("utf-8")[:72], hashed_password.encode("utf-8"))
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password using bcrypt."""
-    # Truncate password to 72 bytes for bcrypt compatibility
-    truncated_password = password[:72] if len(password.encode('utf-8')) > 72 else password
-    return pwd_context.hash(truncated_password)
+    # bcrypt only uses the first 72 bytes of the secret
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode("utf-8")[:72], salt).decode("utf-8")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -37,11 +54,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expires_in = expires_delta.total_seconds()
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expires_in = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     
-    to_encode.update({"exp": expire})
+    # Epoch seconds are what ends up in the token anyway
+    to_encode.update({"exp": int(time.time() + expires_in)})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     
     return encoded_jwt
@@ -51,14 +69,30 @@ def decode_access_token(token: str) -> Optional[dict]:
     """
     Decode and verify a JWT access token.
     
+    Verified payloads are cached briefly so repeated requests with the
+    same token skip signature verification.
+    
     Args:
         token: JWT token string
         
     Returns:
         Decoded token payload or None if invalid
     """
+    key = hashlib.sha256(token.encode()).digest()[:16]
+    try:
+        return _jwt_cache[key]
+    except KeyError:
+        pass
+    
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
-    except JWTError:
-        return None
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM],
+            options={"require": ["exp", "sub"]}
+        )
+    except InvalidTokenError:
+        payload = None
+    
+    _jwt_cache[key] = payload
+    return payload
@@ -0,0 +1,38 @@
+from cachetools import TTLCache
+from typing import Optional
+from app.models.user import User
+
+
+# Short-lived per-process cache of (revision, user) pairs keyed by username
+_user_cache: TTLCache = TTLCache(maxsize=5000, ttl=10)
+
+
+async def get_user_by_username(username: str, rev: int) -> Optional[User]:
+    """
+    Get a user by username, served from the process-local cache when possible.
+    
+    Entries are tagged with the user's revision counter, so an entry cached
+    before another worker bumped the revision is treated as a miss.
+    
+    Args:
+        username: Username to look up
+        rev: Current revision counter of the user
+        
+    Returns:
+        User object or None if not found
+    """
+    entry = _user_cache.get(username)
+    if entry is not None and entry[0] == rev:
+        return entry[1]
+    
+    user = await User.find_one(User.username == username)
+    if user is not None:
+        _user_cache[username] = (rev, user)
+    else:
+        _user_cache.pop(username, None)
+    return user
+
+
+def invalidate(username: str) -> None:
+    """Drop a user from the process-local cache."""
+    _user_cache.pop(username, None)
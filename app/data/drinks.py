@@ -1,7 +1,7 @@
 """Popular alcoholic drinks database."""
 
 # Typy alkoholu (kategorie)
-DRINK_TYPES = [
+DRINK_TYPES = (
     "Beer",
     "Wine",
     "Whiskey",
@@ -18,10 +18,10 @@ DRINK_TYPES = [
     "Absinthe",
     "Mead",
     "Cider",
-]
+)
 
 # České piva
-CZECH_BEERS = [
+CZECH_BEERS = (
     # Pilsner
     "Pilsner Urquell",
     "Gambrinus",
@@ -56,9 +56,9 @@ CZECH_BEERS = [
     "Klášter",
     "Louny",
     "Rohozec",
-]
+)
 
-ALCOHOLIC_DRINKS = [
+ALCOHOLIC_DRINKS = (
     # Beer
     "Pilsner",
     "Lager",
@@ -112,4 +112,9 @@ ALCOHOLIC_DRINKS = [
     "Absinthe",
     "Mead",
     "Cider",
-]
+)
+
+# Membership lookup sets
+DRINK_TYPES_SET = frozenset(DRINK_TYPES)
+CZECH_BEERS_SET = frozenset(CZECH_BEERS)
+ALCOHOLIC_DRINKS_SET = frozenset(ALCOHOLIC_DRINKS)
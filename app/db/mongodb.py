@@ -12,7 +12,15 @@ class MongoDB:
     @classmethod
     async def connect_db(cls):
         """Initialize MongoDB connection and Beanie ODM."""
-        cls.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        cls.client = AsyncIOMotorClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGO_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            compressors=settings.MONGO_COMPRESSORS,
+            retryWrites=True,
+            w=1,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS
+        )
         
         # Import models here to avoid circular imports
         from app.models.user import User
@@ -27,6 +35,18 @@ class MongoDB:
             document_models=[User, Post, Comment, Message, Friendship, PrivateMessage]
         )
         
+        # Registration relies on these unique indexes to reject duplicates
+        index_info = await User.get_motor_collection().index_information()
+        for field in ("username", "email"):
+            if not any(
+                index.get("unique") and index["key"] == [(field, 1)]
+                for index in index_info.values()
+            ):
+                raise RuntimeError(
+                    f"Missing unique index on users.{field}; "
+                    "run `python -m scripts.migrate_user_indexes`"
+                )
+        
         print(f"✅ Connected to MongoDB at {settings.MONGODB_URL}")
     
     @classmethod
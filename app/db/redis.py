@@ -1,22 +1,62 @@
 import redis.asyncio as redis
 from typing import Optional
+import time
+import uuid
 from app.core.config import settings
 
 
+# Fixed-window counter: INCR and set the TTL on the first hit, atomically
+RATE_LIMIT_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+# Sliding-window log: drop stamps older than the window, then record this hit
+# only if the window still has room. Returns 1 if allowed, 0 if limited.
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('EXPIRE', KEYS[1], window)
+return 1
+"""
+
+
 class RedisClient:
     """Redis connection manager."""
     
     client: Optional[redis.Redis] = None
+    pool: Optional[redis.ConnectionPool] = None
     pubsub: Optional[redis.client.PubSub] = None
+    rate_limit_script = None
+    sliding_window_script = None
     
     @classmethod
     async def connect_redis(cls):
-        """Initialize Redis connection pool."""
-        cls.client = await redis.from_url(
+        """
+        Initialize Redis connection pool.
+        
+        Responses are returned as raw bytes; cached values are JSON blobs
+        that json/orjson parse directly without a str round-trip. A full pool
+        makes callers wait for a free connection instead of failing.
+        """
+        cls.pool = redis.BlockingConnectionPool.from_url(
             settings.REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True
+            max_connections=settings.REDIS_POOL_SIZE,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            decode_responses=False
         )
+        cls.client = redis.Redis(connection_pool=cls.pool)
+        cls.rate_limit_script = cls.client.register_script(RATE_LIMIT_LUA)
+        cls.sliding_window_script = cls.client.register_script(SLIDING_WINDOW_LUA)
         
         # Test connection
         await cls.client.ping()
@@ -27,6 +67,7 @@ class RedisClient:
         """Close Redis connection."""
         if cls.client:
             await cls.client.close()
+            await cls.pool.disconnect()
             print("❌ Redis connection closed")
     
     @classmethod
@@ -37,6 +78,60 @@ class RedisClient:
         return cls.client
 
 
+async def hit_rate_limit(client: redis.Redis, key: str, window: int) -> int:
+    """
+    Count a hit against a fixed-window rate limit in a single round-trip.
+    
+    Args:
+        client: Redis client to run the script on
+        key: Rate limit counter key
+        window: Window length in seconds
+        
+    Returns:
+        Number of hits in the current window, including this one
+    """
+    return await RedisClient.rate_limit_script(keys=[key], args=[window], client=client)
+
+
+async def allow_sliding_window(client: redis.Redis, key: str, limit: int, window: int) -> bool:
+    """
+    Check and record a hit against a sliding-window rate limit atomically.
+    
+    Args:
+        client: Redis client to run the script on
+        key: Rate limit sorted set key
+        limit: Maximum hits allowed within any window
+        window: Window length in seconds
+        
+    Returns:
+        True if the hit is allowed, False if the limit is reached
+    """
+    allowed = await RedisClient.sliding_window_script(
+        keys=[key],
+        args=[time.time(), window, limit, uuid.uuid4().hex],
+        client=client
+    )
+    return allowed == 1
+
+
+# Cache version counters. Cached entries embed the current version in their
+# key, so bumping the counter invalidates every entry at once.
+FEED_VERSION_KEY = "posts:feed:ver"
+
+
+def comments_version_key(post_id: str) -> str:
+    """Version counter for the cached comment pages of a post."""
+    return f"comments:{post_id}:ver"
+
+
+async def bump_versions(client: redis.Redis, *version_keys: str) -> None:
+    """Invalidate the caches behind one or more version counters in a single round-trip."""
+    async with client.pipeline(transaction=False) as pipe:
+        for key in version_keys:
+            pipe.incr(key)
+        await pipe.execute()
+
+
 # Convenience function
 async def get_redis() -> redis.Redis:
     """Dependency to get Redis client."""
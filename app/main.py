@@ -1,8 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-from pathlib import Path
 from app.db.mongodb import MongoDB
 from app.db.redis import RedisClient
 from app.routers import auth, users, posts, friends, comments, chat
@@ -24,6 +24,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown: Close database connections
     print("🛑 Shutting down DrinkBuddies API...")
+    await chat.pubsub_router.close()
+    await chat.message_writer.close()
     await MongoDB.close_db()
     await RedisClient.close_redis()
     print("✅ All connections closed")
@@ -34,6 +36,7 @@ app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="A social network API for recovering alcoholics to connect and support each other.",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -47,10 +50,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount uploads directory for static files
-UPLOAD_DIR = Path("/app/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+# Mount uploads directory for static files (created by the posts router)
+app.mount("/uploads", StaticFiles(directory=str(posts.UPLOAD_DIR)), name="uploads")
 
 # Include routers
 app.include_router(auth.router)
@@ -87,5 +88,7 @@ if __name__ == "__main__":
         "app.main:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
         reload=True
     )
@@ -1,4 +1,4 @@
-from beanie import Document
+from beanie import Document, PydanticObjectId
 from datetime import datetime
 from typing import Optional
 from pydantic import Field
@@ -8,20 +8,26 @@ class Friendship(Document):
     """
     Friendship model representing connection between two users.
     """
-    user_id: str = Field(..., description="ID of user who sent friend request")
-    friend_id: str = Field(..., description="ID of user who received request")
+    user_id: PydanticObjectId = Field(..., description="ID of user who sent friend request")
+    friend_id: PydanticObjectId = Field(..., description="ID of user who received request")
     status: str = Field(default="pending", description="pending, accepted, rejected")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
     
     class Settings:
         name = "Friendship"
+        indexes = [
+            # Both branches of the $or friendship check become bounded index scans
+            [("user_id", 1), ("friend_id", 1), ("status", 1)],
+            [("friend_id", 1), ("user_id", 1), ("status", 1)],
+            [("friend_id", 1), ("status", 1)],  # Index for pending requests
+        ]
         
     class Config:
         json_schema_extra = {
             "example": {
-                "user_id": "user123",
-                "friend_id": "user456",
+                "user_id": "65a1b2c3d4e5f6a7b8c9d0e1",
+                "friend_id": "65a1b2c3d4e5f6a7b8c9d0e2",
                 "status": "accepted"
             }
         }
@@ -31,9 +37,9 @@ class PrivateMessage(Document):
     """
     Private message between two users.
     """
-    sender_id: str = Field(..., description="ID of message sender")
+    sender_id: PydanticObjectId = Field(..., description="ID of message sender")
     sender_username: str
-    receiver_id: str = Field(..., description="ID of message receiver")
+    receiver_id: PydanticObjectId = Field(..., description="ID of message receiver")
     receiver_username: str
     message: str = Field(..., min_length=1, max_length=2000)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -41,13 +47,19 @@ class PrivateMessage(Document):
     
     class Settings:
         name = "PrivateMessage"
+        indexes = [
+            # Indexes for both directions of a conversation, newest first
+            [("sender_id", 1), ("receiver_id", 1), ("created_at", -1)],
+            [("receiver_id", 1), ("sender_id", 1), ("created_at", -1)],
+            [("receiver_id", 1), ("read", 1)],  # Index for unread messages
+        ]
         
     class Config:
         json_schema_extra = {
             "example": {
-                "sender_id": "user123",
+                "sender_id": "65a1b2c3d4e5f6a7b8c9d0e1",
                 "sender_username": "john",
-                "receiver_id": "user456",
+                "receiver_id": "65a1b2c3d4e5f6a7b8c9d0e2",
                 "receiver_username": "jane",
                 "message": "Hey, how are you?"
             }
@@ -21,6 +21,8 @@ class Post(Document):
         name = "posts"
         indexes = [
             [("created_at", -1)],  # Index for chronological sorting
+            [("author.$id", 1), ("created_at", -1)],  # Index for posts by author
+            [("liked_by", 1), ("created_at", -1)],  # Index for posts liked by a user
         ]
     
     class Config:
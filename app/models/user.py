@@ -1,9 +1,20 @@
-from beanie import Document, Indexed
-from pydantic import EmailStr, Field
+from beanie import Document, Indexed, PydanticObjectId
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import Optional, List
 
 
+def days_sober_at(sober_date: Optional[datetime], now: datetime) -> Optional[int]:
+    """
+    Calculate days sober at a given time.
+    
+    Lets list endpoints read the clock once instead of once per user.
+    """
+    if sober_date:
+        return (now - sober_date).days
+    return None
+
+
 class User(Document):
     """User model for authentication and profile."""
     
@@ -18,19 +29,14 @@ class User(Document):
     is_active: bool = True
     
     class Settings:
+        # username and email get their unique indexes from Indexed(..., unique=True);
+        # listing them here as well would override those with non-unique ones
         name = "users"
-        indexes = [
-            "username",
-            "email",
-        ]
     
     @property
     def days_sober(self) -> Optional[int]:
         """Calculate days sober since sober_date."""
-        if self.sober_date:
-            delta = datetime.utcnow() - self.sober_date
-            return delta.days
-        return None
+        return days_sober_at(self.sober_date, datetime.utcnow())
     
     class Config:
         json_schema_extra = {
@@ -41,3 +47,32 @@ class User(Document):
                 "sober_date": "2024-01-01T00:00:00"
             }
         }
+
+
+class AuthUserView(BaseModel):
+    """Projection of the User fields needed to check login credentials."""
+    
+    id: PydanticObjectId = Field(alias="_id")
+    username: str
+    hashed_password: str
+    is_active: bool
+
+
+class AuthorView(BaseModel):
+    """Projection of the User fields shown next to posts and comments."""
+    
+    id: PydanticObjectId = Field(alias="_id")
+    username: str
+
+
+class ProfileView(BaseModel):
+    """Projection of the User fields shown on a public profile."""
+    
+    id: PydanticObjectId = Field(alias="_id")
+    username: str
+    email: str
+    bio: Optional[str] = None
+    favorite_drinks: List[str] = Field(default_factory=list)
+    sober_date: Optional[datetime] = None
+    created_at: datetime
+    is_active: bool
@@ -1,14 +1,53 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
-from app.models.user import User
+import hmac
+from pymongo.errors import DuplicateKeyError
+from app.models.user import User, AuthUserView
 from app.core.schemas import UserRegister, UserLogin, Token, UserResponse
 from app.core.security import verify_password, get_password_hash, create_access_token
 from app.core.config import settings
+from app.db.redis import RedisClient
 
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
+# Seconds a successful password check is remembered in Redis
+PASSWORD_OK_TTL = 60
+
+
+async def check_password(user: AuthUserView, password: str) -> bool:
+    """
+    Verify a login password, remembering successful checks briefly.
+    
+    The Redis key is an HMAC of the username, the stored hash and the
+    password, so no password material reaches Redis and a password change
+    invalidates earlier entries.
+    
+    Args:
+        user: User attempting to log in
+        password: Plain password from the request
+        
+    Returns:
+        True if the password matches
+    """
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(),
+        f"{user.username}:{user.hashed_password}:{password}".encode(),
+        "sha256"
+    ).hexdigest()
+    cache_key = f"pwok:{digest}"
+    
+    redis_client = RedisClient.get_client()
+    if await redis_client.exists(cache_key):
+        return True
+    
+    if not verify_password(password, user.hashed_password):
+        return False
+    
+    await redis_client.setex(cache_key, PASSWORD_OK_TTL, "1")
+    return True
+
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserRegister):
@@ -24,23 +63,7 @@ async def register(user_data: UserRegister):
     Raises:
         HTTPException: If username or email already exists
     """
-    # Check if username already exists
-    existing_user = await User.find_one(User.username == user_data.username)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
-    
-    # Check if email already exists
-    existing_email = await User.find_one(User.email == user_data.email)
-    if existing_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Create new user
+    # Create new user; the unique indexes on username and email reject duplicates
     hashed_password = get_password_hash(user_data.password)
     new_user = User(
         username=user_data.username,
@@ -51,10 +74,18 @@ async def register(user_data: UserRegister):
         sober_date=user_data.sober_date
     )
     
-    await new_user.insert()
+    try:
+        await new_user.insert()
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        detail = "Email already registered" if "email" in key_pattern else "Username already registered"
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
     
     # Convert to response format
-    return UserResponse(
+    return UserResponse.model_construct(
         id=str(new_user.id),
         username=new_user.username,
         email=new_user.email,
@@ -82,7 +113,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         HTTPException: If credentials are invalid
     """
     # Find user by username
-    user = await User.find_one(User.username == form_data.username)
+    user = await User.find_one(User.username == form_data.username).project(AuthUserView)
     
     if not user:
         raise HTTPException(
@@ -92,7 +123,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
     
     # Verify password
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await check_password(user, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -113,7 +144,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         expires_delta=access_token_expires
     )
     
-    return Token(access_token=access_token, token_type="bearer")
+    return Token.model_construct(access_token=access_token, token_type="bearer")
 
 
 @router.post("/login/json", response_model=Token)
@@ -128,7 +159,7 @@ async def login_json(user_credentials: UserLogin):
         JWT access token
     """
     # Find user by username
-    user = await User.find_one(User.username == user_credentials.username)
+    user = await User.find_one(User.username == user_credentials.username).project(AuthUserView)
     
     if not user:
         raise HTTPException(
@@ -137,7 +168,7 @@ async def login_json(user_credentials: UserLogin):
         )
     
     # Verify password
-    if not verify_password(user_credentials.password, user.hashed_password):
+    if not await check_password(user, user_credentials.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -157,4 +188,4 @@ async def login_json(user_credentials: UserLogin):
         expires_delta=access_token_expires
     )
     
-    return Token(access_token=access_token, token_type="bearer")
+    return Token.model_construct(access_token=access_token, token_type="bearer")
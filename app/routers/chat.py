@@ -1,73 +1,241 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from typing import List, Dict
+from typing import Dict, Optional
+from app.core.security import decode_access_token
 from app.models.user import User
-from app.models.friendship import PrivateMessage
+from app.models.friendship import Friendship, PrivateMessage
 from app.db.redis import RedisClient
+from beanie import PydanticObjectId
 from datetime import datetime
-import json
 import asyncio
+import logging
+import uuid
+import orjson
 
 
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
 
+log = logging.getLogger(__name__)
+
 
 class ConnectionManager:
     """Manages WebSocket connections for private messaging."""
     
     def __init__(self):
-        # Store active connections: {room: [(user_id, websocket)]}
-        self.active_connections: Dict[str, List[tuple]] = {}
+        # Active connections keyed by socket id: {room: {id(websocket): websocket}}
+        self.rooms: Dict[str, Dict[int, WebSocket]] = {}
+        # Owner of each connection: {id(websocket): user_id}
+        self.user_of: Dict[int, str] = {}
     
-    async def connect(self, websocket: WebSocket, user_id: str, room: str = "global"):
-        """Accept a WebSocket connection and add to room."""
-        await websocket.accept()
-        
-        if room not in self.active_connections:
-            self.active_connections[room] = []
-        
-        # Check if this exact connection already exists
-        for uid, ws in self.active_connections[room]:
-            if ws == websocket:
-                print(f"⚠️ Connection already exists for user {user_id} in room '{room}'")
-                return
-        
-        self.active_connections[room].append((user_id, websocket))
-        print(f"✅ User {user_id} connected to room '{room}' (total: {len(self.active_connections[room])})")
+    def connect(self, websocket: WebSocket, user_id: str, room: str = "global"):
+        """Add an accepted WebSocket connection to room."""
+        # Keyed by socket id, so registering the same connection twice is a no-op
+        connections = self.rooms.setdefault(room, {})
+        connections[id(websocket)] = websocket
+        self.user_of[id(websocket)] = user_id
+        log.debug("User %s connected to room '%s' (total: %d)", user_id, room, len(connections))
     
     def disconnect(self, websocket: WebSocket, room: str = "global"):
         """Remove a WebSocket connection from room."""
-        if room in self.active_connections:
-            self.active_connections[room] = [
-                (uid, ws) for uid, ws in self.active_connections[room] if ws != websocket
-            ]
-            print(f"❌ Connection disconnected from room '{room}' (remaining: {len(self.active_connections[room])})")
-            
-            # Clean up empty rooms
-            if not self.active_connections[room]:
-                del self.active_connections[room]
+        self.user_of.pop(id(websocket), None)
+        connections = self.rooms.get(room)
+        if connections is None or connections.pop(id(websocket), None) is None:
+            return
+        
+        log.debug("Connection disconnected from room '%s' (remaining: %d)", room, len(connections))
+        
+        # Clean up empty rooms
+        if not connections:
+            del self.rooms[room]
     
-    async def broadcast(self, message: dict, room: str = "global"):
-        """Broadcast message to all connections in a room."""
-        if room not in self.active_connections:
+    async def _safe_send(self, websocket: WebSocket, payload: str) -> bool:
+        """Send a pre-serialized message, reporting whether the socket is still usable."""
+        try:
+            await websocket.send_text(payload)
+            return True
+        except Exception:
+            log.exception("Error sending to user %s", self.user_of.get(id(websocket)))
+            return False
+    
+    async def broadcast(self, message: dict, room: str = "global", exclude: Optional[int] = None):
+        """Broadcast message to all connections in a room, optionally skipping one socket id."""
+        connections = self.rooms.get(room)
+        if not connections:
             return
         
-        # Send to all connected clients in the room
-        to_remove = []
-        for i, (user_id, websocket) in enumerate(self.active_connections[room]):
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                print(f"Error sending to user {user_id}: {e}")
-                to_remove.append(websocket)
+        # Serialize once and write to every client in the room concurrently
+        payload = orjson.dumps(message).decode()
+        sockets = [ws for socket_id, ws in connections.items() if socket_id != exclude]
+        results = await asyncio.gather(*(self._safe_send(ws, payload) for ws in sockets))
         
         # Clean up disconnected websockets
-        for ws in to_remove:
-            self.disconnect(ws, room)
+        for ws, ok in zip(sockets, results):
+            if not ok:
+                self.disconnect(ws, room)
 
 
 # Global connection manager instance
 manager = ConnectionManager()
 
+# Identifies this worker in published messages so a connection can recognise its own
+_NODE_ID = uuid.uuid4().hex
+
+
+class PubSubRouter:
+    """
+    Shares one Redis subscription per room among all local connections.
+    
+    A single listener task reads every subscribed channel and hands each
+    message to ConnectionManager.broadcast() for the room's local sockets.
+    """
+    
+    def __init__(self):
+        self.pubsub = None
+        self.listener: Optional[asyncio.Task] = None
+        # Local connections per room: {room: count}
+        self.members: Dict[str, int] = {}
+        # Serializes the first subscribe of each room: {room: lock}
+        self.subscribe_locks: Dict[str, asyncio.Lock] = {}
+    
+    async def join(self, room: str):
+        """
+        Register a local connection, subscribing to the room on first join.
+        
+        Connections joining while the first subscribe is in flight wait for
+        it. If it fails, nothing is counted and the next waiter retries, so
+        leave() must only be called after join() returned.
+        """
+        if self.members.get(room):
+            self.members[room] += 1
+            return
+        
+        lock = self.subscribe_locks.setdefault(room, asyncio.Lock())
+        async with lock:
+            if not self.members.get(room):
+                if self.pubsub is None:
+                    self.pubsub = RedisClient.get_client().pubsub()
+                await self.pubsub.subscribe(f"chat:{room}")
+                
+                # listen() returns once nothing is subscribed, so restart it as needed
+                if self.listener is None or self.listener.done():
+                    self.listener = asyncio.create_task(self._listen())
+            
+            self.members[room] = self.members.get(room, 0) + 1
+    
+    async def leave(self, room: str):
+        """Unregister a local connection, unsubscribing after the last one leaves."""
+        count = self.members.get(room, 0) - 1
+        if count > 0:
+            self.members[room] = count
+            return
+        
+        self.members.pop(room, None)
+        lock = self.subscribe_locks.get(room)
+        if lock is not None and not lock.locked():
+            del self.subscribe_locks[room]
+        await self.pubsub.unsubscribe(f"chat:{room}")
+    
+    async def _listen(self):
+        """Forward published messages to the local sockets of their room."""
+        while True:
+            try:
+                async for message in self.pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    room = message["channel"].decode().removeprefix("chat:")
+                    data = orjson.loads(message["data"])
+                    
+                    # The sender already echoed its own message
+                    node_id, _, socket_id = data.pop("origin", "").partition(":")
+                    exclude = int(socket_id) if node_id == _NODE_ID else None
+                    await manager.broadcast(data, room, exclude)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Error dispatching private message")
+                # The subscription reconnects and resubscribes on the next read
+                await asyncio.sleep(1)
+                if not self.members:
+                    return
+    
+    async def close(self):
+        """Stop the listener and release the subscription connection."""
+        if self.listener:
+            self.listener.cancel()
+        if self.pubsub:
+            await self.pubsub.close()
+        self.members.clear()
+        self.subscribe_locks.clear()
+
+
+# Global pub/sub router instance
+pubsub_router = PubSubRouter()
+
+# Chat messages are written to MongoDB in batches of up to this many...
+MESSAGE_BATCH_SIZE = 100
+# ...or after this many seconds, whichever comes first
+MESSAGE_FLUSH_INTERVAL = 0.05
+
+
+class MessageWriter:
+    """
+    Buffers private messages and saves them with insert_many.
+    
+    Messages carry their id from construction, so they can be delivered
+    before they are written.
+    """
+    
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+    
+    def add(self, message: PrivateMessage):
+        """Queue a message for the next batch."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        self.queue.put_nowait(message)
+    
+    async def _run(self):
+        """Collect queued messages into batches until a None sentinel arrives."""
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await self.queue.get()
+            batch = []
+            deadline = loop.time() + MESSAGE_FLUSH_INTERVAL
+            while message is not None:
+                batch.append(message)
+                timeout = deadline - loop.time()
+                if len(batch) >= MESSAGE_BATCH_SIZE or timeout <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            
+            if batch:
+                try:
+                    await PrivateMessage.insert_many(batch)
+                except Exception:
+                    log.exception("Error saving %d private messages", len(batch))
+            
+            if message is None:
+                return
+    
+    async def close(self):
+        """Write out every queued message and stop the writer."""
+        if self.task is None:
+            return
+        self.queue.put_nowait(None)
+        await self.task
+        self.task = None
+
+
+# Global message writer instance
+message_writer = MessageWriter()
+
+# Seconds a verified (user, friend) pair is trusted before checking MongoDB again
+WS_AUTH_TTL = 60
+
 
 @router.websocket("/ws/private/{friend_username}")
 async def private_websocket_endpoint(
@@ -84,9 +252,6 @@ async def private_websocket_endpoint(
         token: JWT token for authentication
     """
     # Authenticate user
-    from app.core.security import decode_access_token
-    from app.models.friendship import Friendship
-    
     payload = decode_access_token(token)
     if not payload:
         await websocket.close(code=1008, reason="Invalid token")
@@ -97,44 +262,69 @@ async def private_websocket_endpoint(
         await websocket.close(code=1008, reason="Invalid token")
         return
     
-    user = await User.find_one(User.username == username)
-    if not user:
-        await websocket.close(code=1008, reason="User not found")
-        return
-    
-    # Find friend
-    friend = await User.find_one(User.username == friend_username)
-    if not friend:
-        await websocket.close(code=1008, reason="Friend not found")
-        return
+    # Reconnects reuse the ids resolved by a recent successful handshake
+    redis_client = RedisClient.get_client()
+    auth_key = f"ws_auth:{username}:{friend_username}"
+    cached = await redis_client.get(auth_key)
     
-    # Verify friendship
-    friendship = await Friendship.find_one(
-        {
-            "$or": [
-                {"user_id": str(user.id), "friend_id": str(friend.id), "status": "accepted"},
-                {"user_id": str(friend.id), "friend_id": str(user.id), "status": "accepted"}
-            ]
-        }
-    )
-    
-    if not friendship:
-        await websocket.close(code=1008, reason="Not friends")
-        return
+    if cached:
+        user_oid, friend_oid = (PydanticObjectId(i.decode()) for i in cached.split(b":"))
+    else:
+        user = await User.find_one(User.username == username)
+        if not user:
+            await websocket.close(code=1008, reason="User not found")
+            return
+        
+        # Find friend
+        friend = await User.find_one(User.username == friend_username)
+        if not friend:
+            await websocket.close(code=1008, reason="Friend not found")
+            return
+        
+        # Verify friendship
+        friendship = await Friendship.find_one(
+            {
+                "$or": [
+                    {"user_id": user.id, "friend_id": friend.id, "status": "accepted"},
+                    {"user_id": friend.id, "friend_id": user.id, "status": "accepted"}
+                ]
+            }
+        )
+        
+        if not friendship:
+            await websocket.close(code=1008, reason="Not friends")
+            return
+        
+        user_oid, friend_oid = user.id, friend.id
+        await redis_client.setex(auth_key, WS_AUTH_TTL, f"{user_oid}:{friend_oid}")
     
     # Create unique room for this conversation (sorted IDs for consistency)
-    room = f"private:{min(str(user.id), str(friend.id))}:{max(str(user.id), str(friend.id))}"
-    user_id = str(user.id)
+    uid, fid = str(user_oid), str(friend_oid)
+    room = f"private:{min(uid, fid)}:{max(uid, fid)}"
+    origin = f"{_NODE_ID}:{id(websocket)}"
     
-    # Connect to room
-    await manager.connect(websocket, user_id, room)
+    # Only accept once the user and friendship are verified; rejections above
+    # close the socket before accept(), so the client gets an HTTP 403 instead
+    # of a completed WebSocket handshake
+    await websocket.accept()
     
-    # Setup Redis Pub/Sub
-    redis_client = RedisClient.get_client()
-    pubsub = redis_client.pubsub()
-    await pubsub.subscribe(f"chat:{room}")
+    # Fields shared by every message this connection sends
+    payload_template = {
+        "type": "private_message",
+        "sender_username": username,
+        "sender_id": uid,
+        "receiver_username": friend_username,
+        "receiver_id": fid,
+        "read": False
+    }
     
+    joined = False
     try:
+        # Receive the room's messages through the shared subscription
+        await pubsub_router.join(room)
+        joined = True
+        manager.connect(websocket, uid, room)
+        
         # Send welcome message
         await websocket.send_json({
             "type": "system",
@@ -147,68 +337,47 @@ async def private_websocket_endpoint(
             while True:
                 try:
                     data = await websocket.receive_text()
-                    message_data = json.loads(data)
+                    message_data = orjson.loads(data)
                     
-                    # Save private message to database
+                    # Queue private message for the next batched write
                     new_message = PrivateMessage(
-                        sender_id=str(user.id),
-                        sender_username=user.username,
-                        receiver_id=str(friend.id),
+                        id=PydanticObjectId(),
+                        sender_id=user_oid,
+                        sender_username=username,
+                        receiver_id=friend_oid,
                         receiver_username=friend_username,
                         message=message_data.get("content", "")
                     )
-                    await new_message.insert()
+                    message_writer.add(new_message)
                     
                     # Publish to Redis for broadcasting
                     message_payload = {
-                        "type": "private_message",
+                        **payload_template,
                         "id": str(new_message.id),
                         "content": new_message.message,
-                        "sender_username": user.username,
-                        "sender_id": user_id,
-                        "receiver_username": friend_username,
-                        "receiver_id": str(friend.id),
-                        "timestamp": new_message.created_at.isoformat(),
-                        "read": False
+                        "timestamp": new_message.created_at.isoformat()
                     }
                     
+                    # Echo to the sender directly; Redis only carries it to the other side
+                    await websocket.send_text(orjson.dumps(message_payload).decode())
                     await redis_client.publish(
                         f"chat:{room}",
-                        json.dumps(message_payload)
+                        orjson.dumps({**message_payload, "origin": origin})
                     )
                     
                 except WebSocketDisconnect:
                     break
-                except Exception as e:
-                    print(f"Error receiving private message: {e}")
-                    break
-        
-        async def publish_messages():
-            """Listen to Redis Pub/Sub and broadcast to WebSocket."""
-            while True:
-                try:
-                    message = await pubsub.get_message(ignore_subscribe_messages=True)
-                    if message and message["type"] == "message":
-                        data = json.loads(message["data"])
-                        await manager.broadcast(data, room)
-                    await asyncio.sleep(0.01)
-                except Exception as e:
-                    print(f"Error publishing private message: {e}")
+                except Exception:
+                    log.exception("Error receiving private message")
                     break
         
-        # Run both tasks concurrently
-        await asyncio.gather(
-            receive_messages(),
-            publish_messages()
-        )
+        await receive_messages()
         
     except WebSocketDisconnect:
-        manager.disconnect(websocket, room)
-        print(f"User {username} disconnected from private chat with {friend_username}")
-    except Exception as e:
-        print(f"Private WebSocket error: {e}")
-        manager.disconnect(websocket, room)
+        log.debug("User %s disconnected from private chat with %s", username, friend_username)
+    except Exception:
+        log.exception("Private WebSocket error")
     finally:
-        await pubsub.unsubscribe(f"chat:{room}")
-        await pubsub.close()
-
+        manager.disconnect(websocket, room)
+        if joined:
+            await pubsub_router.leave(room)
@@ -1,12 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from typing import List
-import json
 from app.models.comment import Comment
 from app.models.post import Post
 from app.models.user import User
-from app.core.post_schemas import CommentCreate, CommentResponse
+from app.core.post_schemas import CommentCreate, CommentResponse, comment_list_adapter
 from app.core.dependencies import get_current_active_user
-from app.db.redis import RedisClient
+from redis.asyncio import Redis
+from app.db.redis import get_redis, FEED_VERSION_KEY, comments_version_key, hit_rate_limit, bump_versions
 from beanie import PydanticObjectId
 
 
@@ -17,7 +17,8 @@ router = APIRouter(prefix="/api/posts", tags=["Comments"])
 async def create_comment(
     post_id: str,
     comment_data: CommentCreate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Create a new comment on a post.
@@ -26,6 +27,7 @@ async def create_comment(
         post_id: Post ID
         comment_data: Comment content
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Returns:
         Created comment
@@ -34,11 +36,7 @@ async def create_comment(
         HTTPException: If post not found
     """
     # Rate limiting: max 20 comments per minute
-    redis_client = RedisClient.get_client()
-    rate_key = f"rate_limit:comment:{current_user.id}"
-    comment_count = await redis_client.incr(rate_key)
-    if comment_count == 1:
-        await redis_client.expire(rate_key, 60)
+    comment_count = await hit_rate_limit(redis_client, f"rate_limit:comment:{current_user.id}", 60)
     if comment_count > 20:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -70,14 +68,12 @@ async def create_comment(
     await new_comment.insert()
     
     # Increment comments count on post
-    post.comments_count += 1
-    await post.save()
+    await post.update({"$inc": {"comments_count": 1}})
     
     # Invalidate comments and posts cache
-    await redis_client.delete(f"comments:{post_id}")
-    await redis_client.delete("posts:feed:*")
+    await bump_versions(redis_client, comments_version_key(post_id), FEED_VERSION_KEY)
     
-    return CommentResponse(
+    return CommentResponse.model_construct(
         id=str(new_comment.id),
         content=new_comment.content,
         author_username=current_user.username,
@@ -92,7 +88,8 @@ async def create_comment(
 async def get_comments(
     post_id: str,
     skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100)
+    limit: int = Query(50, ge=1, le=100),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Get comments for a post.
@@ -101,6 +98,7 @@ async def get_comments(
         post_id: Post ID
         skip: Number of comments to skip (for pagination)
         limit: Maximum number of comments to return
+        redis_client: Redis client from dependency
         
     Returns:
         List of comments
@@ -109,13 +107,13 @@ async def get_comments(
         HTTPException: If post not found
     """
     # Try to get from cache first (only for first page)
-    redis_client = RedisClient.get_client()
-    cache_key = f"comments:{post_id}:{skip}:{limit}"
-    
     if skip == 0:  # Only cache first page
+        comments_version = int(await redis_client.get(comments_version_key(post_id)) or 0)
+        cache_key = f"comments:{post_id}:v{comments_version}:{skip}:{limit}"
         cached = await redis_client.get(cache_key)
         if cached:
-            return json.loads(cached)
+            # Cached value is the exact response body
+            return Response(content=cached, media_type="application/json")
     
     # Verify post exists
     try:
@@ -132,30 +130,45 @@ async def get_comments(
             detail="Post not found"
         )
     
-    # Fetch comments
-    comments = await Comment.find(
-        Comment.post_id == PydanticObjectId(post_id)
-    ).sort("+created_at").skip(skip).limit(limit).to_list()
-    
-    response = []
-    for comment in comments:
-        # Fetch author information
-        await comment.fetch_link(Comment.author)
-        author = comment.author
-        
-        response.append(CommentResponse(
-            id=str(comment.id),
-            content=comment.content,
-            author_username=author.username,
-            author_id=str(author.id),
-            post_id=str(comment.post_id),
-            created_at=comment.created_at,
-            updated_at=comment.updated_at
-        ))
+    # Fetch comments joined with their authors in a single pipeline
+    comments = await Comment.aggregate([
+        {"$match": {"post_id": post.id}},
+        {"$sort": {"created_at": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "users",
+            "localField": "author.$id",
+            "foreignField": "_id",
+            "as": "author_doc"
+        }},
+        {"$unwind": "$author_doc"},
+        {"$project": {
+            "content": 1,
+            "post_id": 1,
+            "created_at": 1,
+            "updated_at": 1,
+            "author_doc._id": 1,
+            "author_doc.username": 1
+        }}
+    ]).to_list()
+    
+    response = [
+        CommentResponse.model_construct(
+            id=str(comment["_id"]),
+            content=comment["content"],
+            author_username=comment["author_doc"]["username"],
+            author_id=str(comment["author_doc"]["_id"]),
+            post_id=str(comment["post_id"]),
+            created_at=comment["created_at"],
+            updated_at=comment["updated_at"]
+        )
+        for comment in comments
+    ]
     
     # Cache first page for 2 minutes
     if skip == 0:
-        await redis_client.setex(cache_key, 120, json.dumps([r.model_dump(mode='json') for r in response]))
+        await redis_client.setex(cache_key, 120, comment_list_adapter.dump_json(response))
     
     return response
 
@@ -164,7 +177,8 @@ async def get_comments(
 async def delete_comment(
     post_id: str,
     comment_id: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Delete a comment (only by the author).
@@ -173,6 +187,7 @@ async def delete_comment(
         post_id: Post ID
         comment_id: Comment ID
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Raises:
         HTTPException: If comment not found or user is not the author
@@ -198,10 +213,8 @@ async def delete_comment(
             detail="Comment does not belong to this post"
         )
     
-    # Fetch author to check ownership
-    await comment.fetch_link(Comment.author)
-    
-    if comment.author.id != current_user.id:
+    # The link already holds the author id, so ownership needs no lookup
+    if comment.author.ref.id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to delete this comment"
@@ -210,16 +223,10 @@ async def delete_comment(
     # Delete comment
     await comment.delete()
     
-    # Decrement comments count on post
-    try:
-        post = await Post.get(PydanticObjectId(post_id))
-        if post:
-            post.comments_count = max(0, post.comments_count - 1)
-            await post.save()
-    except Exception:
-        pass  # If post doesn't exist, just delete the comment
+    # Decrement comments count on post (no-op if the post is gone)
+    await Post.find_one(
+        {"_id": comment.post_id, "comments_count": {"$gt": 0}}
+    ).update({"$inc": {"comments_count": -1}})
     
     # Invalidate comments and posts cache
-    redis_client = RedisClient.get_client()
-    await redis_client.delete(f"comments:{post_id}*")
-    await redis_client.delete("posts:feed:*")
+    await bump_versions(redis_client, comments_version_key(post_id), FEED_VERSION_KEY)
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-import json
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+import orjson
 from app.core.dependencies import get_current_user
 from app.core.friend_schemas import (
     FriendRequestCreate,
@@ -8,10 +8,12 @@ from app.core.friend_schemas import (
     PrivateMessageCreate,
     PrivateMessageResponse
 )
-from app.models.user import User
+from app.models.user import User, AuthorView, days_sober_at
 from app.models.friendship import Friendship, PrivateMessage
-from app.db.redis import RedisClient
+from redis.asyncio import Redis
+from app.db.redis import get_redis
 from datetime import datetime
+from beanie import PydanticObjectId
 
 
 router = APIRouter(prefix="/api/friends", tags=["Friends"])
@@ -20,7 +22,8 @@ router = APIRouter(prefix="/api/friends", tags=["Friends"])
 @router.post("/request", response_model=FriendRequestResponse, status_code=status.HTTP_201_CREATED)
 async def send_friend_request(
     request: FriendRequestCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Send friend request to another user."""
     # Find the friend by username
@@ -35,8 +38,8 @@ async def send_friend_request(
     existing = await Friendship.find_one(
         {
             "$or": [
-                {"user_id": str(current_user.id), "friend_id": str(friend.id)},
-                {"user_id": str(friend.id), "friend_id": str(current_user.id)}
+                {"user_id": current_user.id, "friend_id": friend.id},
+                {"user_id": friend.id, "friend_id": current_user.id}
             ]
         }
     )
@@ -46,18 +49,16 @@ async def send_friend_request(
     
     # Create friendship
     friendship = Friendship(
-        user_id=str(current_user.id),
-        friend_id=str(friend.id),
+        user_id=current_user.id,
+        friend_id=friend.id,
         status="pending"
     )
     await friendship.insert()
     
     # Invalidate friends cache
-    redis_client = RedisClient.get_client()
-    await redis_client.delete(f"friends:{current_user.id}")
-    await redis_client.delete(f"friends:{friend.id}")
+    await redis_client.delete(f"friends:{current_user.id}", f"friends:{friend.id}")
     
-    return FriendRequestResponse(
+    return FriendRequestResponse.model_construct(
         id=str(friendship.id),
         user_id=str(current_user.id),
         user_username=current_user.username,
@@ -71,23 +72,31 @@ async def send_friend_request(
 @router.get("/requests", response_model=List[FriendRequestResponse])
 async def get_friend_requests(current_user: User = Depends(get_current_user)):
     """Get pending friend requests."""
-    requests = await Friendship.find(
-        {"friend_id": str(current_user.id), "status": "pending"}
-    ).to_list()
-    
-    result = []
-    for req in requests:
-        user = await User.get(req.user_id)
-        if user:
-            result.append(FriendRequestResponse(
-                id=str(req.id),
-                user_id=str(user.id),
-                user_username=user.username,
-                friend_id=str(current_user.id),
-                friend_username=current_user.username,
-                status=req.status,
-                created_at=req.created_at
-            ))
+    requests = await Friendship.aggregate([
+        {"$match": {"friend_id": current_user.id, "status": "pending"}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "_id",
+            "as": "user"
+        }},
+        {"$unwind": "$user"},
+        {"$project": {"status": 1, "created_at": 1, "user._id": 1, "user.username": 1}}
+    ]).to_list()
+    
+    current_user_id = str(current_user.id)
+    result = [
+        FriendRequestResponse.model_construct(
+            id=str(req["_id"]),
+            user_id=str(req["user"]["_id"]),
+            user_username=req["user"]["username"],
+            friend_id=current_user_id,
+            friend_username=current_user.username,
+            status=req["status"],
+            created_at=req["created_at"]
+        )
+        for req in requests
+    ]
     
     return result
 
@@ -95,24 +104,21 @@ async def get_friend_requests(current_user: User = Depends(get_current_user)):
 @router.post("/accept/{request_id}")
 async def accept_friend_request(
     request_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Accept friend request."""
     friendship = await Friendship.get(request_id)
     if not friendship:
         raise HTTPException(status_code=404, detail="Friend request not found")
     
-    if friendship.friend_id != str(current_user.id):
+    if friendship.friend_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not your friend request")
     
-    friendship.status = "accepted"
-    friendship.updated_at = datetime.utcnow()
-    await friendship.save()
+    await friendship.update({"$set": {"status": "accepted", "updated_at": datetime.utcnow()}})
     
     # Invalidate friends cache for both users
-    redis_client = RedisClient.get_client()
-    await redis_client.delete(f"friends:{current_user.id}")
-    await redis_client.delete(f"friends:{friendship.user_id}")
+    await redis_client.delete(f"friends:{current_user.id}", f"friends:{friendship.user_id}")
     
     return {"message": "Friend request accepted"}
 
@@ -120,64 +126,86 @@ async def accept_friend_request(
 @router.post("/reject/{request_id}")
 async def reject_friend_request(
     request_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Reject friend request."""
     friendship = await Friendship.get(request_id)
     if not friendship:
         raise HTTPException(status_code=404, detail="Friend request not found")
     
-    if friendship.friend_id != str(current_user.id):
+    if friendship.friend_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not your friend request")
     
     await friendship.delete()
     
     # Invalidate friends cache
-    redis_client = RedisClient.get_client()
-    await redis_client.delete(f"friends:{current_user.id}")
-    await redis_client.delete(f"friends:{friendship.user_id}")
+    await redis_client.delete(f"friends:{current_user.id}", f"friends:{friendship.user_id}")
     
     return {"message": "Friend request rejected"}
 
 
 @router.get("/list", response_model=List[dict])
-async def get_friends(current_user: User = Depends(get_current_user)):
+async def get_friends(
+    current_user: User = Depends(get_current_user),
+    redis_client: Redis = Depends(get_redis)
+):
     """Get list of friends."""
     # Try cache first
-    redis_client = RedisClient.get_client()
     cache_key = f"friends:{current_user.id}"
     cached = await redis_client.get(cache_key)
     if cached:
-        return json.loads(cached)
+        return orjson.loads(cached)
     
-    friendships = await Friendship.find(
-        {
+    # Resolve the other side of each friendship and join its user document
+    friendships = await Friendship.aggregate([
+        {"$match": {
             "$or": [
-                {"user_id": str(current_user.id), "status": "accepted"},
-                {"friend_id": str(current_user.id), "status": "accepted"}
+                {"user_id": current_user.id, "status": "accepted"},
+                {"friend_id": current_user.id, "status": "accepted"}
             ]
-        }
-    ).to_list()
+        }},
+        {"$project": {
+            "other_id": {"$cond": [{"$eq": ["$user_id", current_user.id]}, "$friend_id", "$user_id"]}
+        }},
+        {"$lookup": {
+            "from": "users",
+            "localField": "other_id",
+            "foreignField": "_id",
+            "as": "friend"
+        }},
+        {"$unwind": "$friend"},
+        {"$project": {
+            "_id": 0,
+            "friend._id": 1,
+            "friend.username": 1,
+            "friend.email": 1,
+            "friend.bio": 1,
+            "friend.sober_date": 1
+        }}
+    ]).to_list()
+    
+    # Check which friends are online in one round-trip
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for friendship in friendships:
+            pipe.exists(f"online:{friendship['friend']['_id']}")
+        online_flags = await pipe.execute()
     
     friends = []
-    for friendship in friendships:
-        friend_id = friendship.friend_id if friendship.user_id == str(current_user.id) else friendship.user_id
-        friend = await User.get(friend_id)
-        if friend:
-            # Check if friend is online
-            is_online = await redis_client.exists(f"online:{friend.id}")
-            
-            friends.append({
-                "id": str(friend.id),
-                "username": friend.username,
-                "email": friend.email,
-                "days_sober": friend.days_sober,
-                "bio": friend.bio,
-                "is_online": bool(is_online)
-            })
+    now = datetime.utcnow()
+    for friendship, is_online in zip(friendships, online_flags):
+        friend = friendship["friend"]
+        friends.append({
+            "id": str(friend["_id"]),
+            "username": friend["username"],
+            "email": friend["email"],
+            "days_sober": days_sober_at(friend.get("sober_date"), now),
+            "bio": friend.get("bio"),
+            "is_online": bool(is_online)
+        })
     
     # Cache for 2 minutes
-    await redis_client.setex(cache_key, 120, json.dumps(friends))
+    await redis_client.setex(cache_key, 120, orjson.dumps(friends))
     
     return friends
 
@@ -185,14 +213,20 @@ async def get_friends(current_user: User = Depends(get_current_user)):
 @router.delete("/{friend_id}")
 async def remove_friend(
     friend_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """Remove friend."""
+    try:
+        friend_oid = PydanticObjectId(friend_id)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Friendship not found")
+    
     friendship = await Friendship.find_one(
         {
             "$or": [
-                {"user_id": str(current_user.id), "friend_id": friend_id, "status": "accepted"},
-                {"user_id": friend_id, "friend_id": str(current_user.id), "status": "accepted"}
+                {"user_id": current_user.id, "friend_id": friend_oid, "status": "accepted"},
+                {"user_id": friend_oid, "friend_id": current_user.id, "status": "accepted"}
             ]
         }
     )
@@ -201,14 +235,19 @@ async def remove_friend(
         raise HTTPException(status_code=404, detail="Friendship not found")
     
     # Get the other user's ID before deleting
-    other_user_id = friendship.friend_id if friendship.user_id == str(current_user.id) else friendship.user_id
+    other_user_id = friendship.friend_id if friendship.user_id == current_user.id else friendship.user_id
     
     await friendship.delete()
     
-    # Invalidate friends cache
-    redis_client = RedisClient.get_client()
-    await redis_client.delete(f"friends:{current_user.id}")
-    await redis_client.delete(f"friends:{other_user_id}")
+    # Invalidate friends cache and the chat handshake cache in both directions
+    other_user = await User.find_one(User.id == other_user_id).project(AuthorView)
+    keys = [f"friends:{current_user.id}", f"friends:{other_user_id}"]
+    if other_user:
+        keys += [
+            f"ws_auth:{current_user.username}:{other_user.username}",
+            f"ws_auth:{other_user.username}:{current_user.username}"
+        ]
+    await redis_client.delete(*keys)
     
     return {"message": "Friend removed"}
 
@@ -228,8 +267,8 @@ async def send_private_message(
     friendship = await Friendship.find_one(
         {
             "$or": [
-                {"user_id": str(current_user.id), "friend_id": str(receiver.id), "status": "accepted"},
-                {"user_id": str(receiver.id), "friend_id": str(current_user.id), "status": "accepted"}
+                {"user_id": current_user.id, "friend_id": receiver.id, "status": "accepted"},
+                {"user_id": receiver.id, "friend_id": current_user.id, "status": "accepted"}
             ]
         }
     )
@@ -238,19 +277,19 @@ async def send_private_message(
         raise HTTPException(status_code=403, detail="Can only message friends")
     
     message = PrivateMessage(
-        sender_id=str(current_user.id),
+        sender_id=current_user.id,
         sender_username=current_user.username,
-        receiver_id=str(receiver.id),
+        receiver_id=receiver.id,
         receiver_username=receiver.username,
         message=message_data.message
     )
     await message.insert()
     
-    return PrivateMessageResponse(
+    return PrivateMessageResponse.model_construct(
         id=str(message.id),
-        sender_id=message.sender_id,
+        sender_id=str(message.sender_id),
         sender_username=message.sender_username,
-        receiver_id=message.receiver_id,
+        receiver_id=str(message.receiver_id),
         receiver_username=message.receiver_username,
         message=message.message,
         created_at=message.created_at,
@@ -261,34 +300,50 @@ async def send_private_message(
 @router.get("/messages/{friend_username}", response_model=List[PrivateMessageResponse])
 async def get_conversation(
     friend_username: str,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=200),
     current_user: User = Depends(get_current_user)
 ):
-    """Get conversation with friend."""
+    """
+    Get conversation with friend in chronological order.
+    
+    Without a limit the whole history is returned; with one, a page of the
+    latest messages starting skip messages back.
+    """
     friend = await User.find_one(User.username == friend_username)
     if not friend:
         raise HTTPException(status_code=404, detail="User not found")
     
-    messages = await PrivateMessage.find(
+    query = PrivateMessage.find(
         {
             "$or": [
-                {"sender_id": str(current_user.id), "receiver_id": str(friend.id)},
-                {"sender_id": str(friend.id), "receiver_id": str(current_user.id)}
+                {"sender_id": current_user.id, "receiver_id": friend.id},
+                {"sender_id": friend.id, "receiver_id": current_user.id}
             ]
         }
-    ).sort("+created_at").to_list()
-    
-    # Mark as read
+    ).sort("-created_at").skip(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    messages = await query.to_list()
+    messages.reverse()
+    
+    # Mark the received messages on this page as read in a single write
+    page_ids = [
+        msg.id for msg in messages
+        if msg.receiver_id == current_user.id and not msg.read
+    ]
+    if page_ids:
+        await PrivateMessage.find({"_id": {"$in": page_ids}}).update({"$set": {"read": True}})
     for msg in messages:
-        if msg.receiver_id == str(current_user.id) and not msg.read:
+        if msg.receiver_id == current_user.id:
             msg.read = True
-            await msg.save()
     
     return [
-        PrivateMessageResponse(
+        PrivateMessageResponse.model_construct(
             id=str(msg.id),
-            sender_id=msg.sender_id,
+            sender_id=str(msg.sender_id),
             sender_username=msg.sender_username,
-            receiver_id=msg.receiver_id,
+            receiver_id=str(msg.receiver_id),
             receiver_username=msg.receiver_username,
             message=msg.message,
             created_at=msg.created_at,
@@ -1,23 +1,65 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File, Form, Response
 from typing import List, Optional
 import os
 import uuid
-import json
+import asyncio
+import aiofiles
 from pathlib import Path
 from app.models.post import Post
-from app.models.user import User
-from app.core.post_schemas import PostCreate, PostUpdate, PostResponse
+from app.models.user import User, AuthorView
+from app.core.post_schemas import PostCreate, PostUpdate, PostResponse, post_list_adapter
 from app.core.dependencies import get_current_active_user, get_optional_user
-from app.db.redis import RedisClient
+from app.core.config import settings
+from redis.asyncio import Redis
+from app.db.redis import get_redis, FEED_VERSION_KEY, allow_sliding_window, bump_versions
 from datetime import datetime
 from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+from bson import ObjectId
 
 
 router = APIRouter(prefix="/api/posts", tags=["Posts"])
 
 # Create uploads directory
-UPLOAD_DIR = Path("/app/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = Path(settings.UPLOAD_DIR)
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Uploads are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Bounds the uploads writing through the file I/O thread pool at once
+upload_slots = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+
+
+def post_response_from_doc(post: dict, author_username: str, author_id, liked_by_user: bool) -> PostResponse:
+    """Build a PostResponse from a raw posts document without validation."""
+    return PostResponse.model_construct(
+        id=str(post["_id"]),
+        content=post["content"],
+        author_username=author_username,
+        author_id=str(author_id),
+        created_at=post["created_at"],
+        updated_at=post["updated_at"],
+        likes_count=post["likes_count"],
+        comments_count=post["comments_count"],
+        image_url=post.get("image_url"),
+        liked_by_user=liked_by_user
+    )
+
+
+def parse_post_id(post_id: str) -> PydanticObjectId:
+    """Parse a post id from the path, answering 404 for malformed ids."""
+    if not ObjectId.is_valid(post_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    return PydanticObjectId(post_id)
+
+
+async def get_author(author_id: PydanticObjectId) -> AuthorView:
+    """Load only the id and username of a post's author."""
+    return await User.find_one(User.id == author_id).project(AuthorView)
 
 
 @router.post("/upload-image")
@@ -35,10 +77,21 @@ async def upload_image(
     unique_filename = f"{uuid.uuid4()}.{file_extension}"
     file_path = UPLOAD_DIR / unique_filename
     
-    # Save file
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    # Stream file to disk, bounding memory use and upload size
+    size = 0
+    async with upload_slots, aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_SIZE:
+                break
+            await buffer.write(chunk)
+    
+    if size > settings.MAX_UPLOAD_SIZE:
+        file_path.unlink()
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Image is too large"
+        )
     
     # Return URL (in production, this would be a CDN URL)
     return {"image_url": f"/uploads/{unique_filename}"}
@@ -48,7 +101,8 @@ async def upload_image(
 async def create_post(
     content: str = Form(...),
     image_url: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Create a new post with optional image.
@@ -57,17 +111,13 @@ async def create_post(
         content: Post content
         image_url: Optional image URL from upload
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Returns:
         Created post
     """
-    # Rate limiting: max 10 posts per minute
-    redis_client = RedisClient.get_client()
-    rate_key = f"rate_limit:post:{current_user.id}"
-    post_count = await redis_client.incr(rate_key)
-    if post_count == 1:
-        await redis_client.expire(rate_key, 60)
-    if post_count > 10:
+    # Rate limiting: max 10 posts in any 60-second window
+    if not await allow_sliding_window(redis_client, f"rate_limit:post_window:{current_user.id}", 10, 60):
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Too many posts. Please wait a moment."
@@ -82,9 +132,9 @@ async def create_post(
     await new_post.insert()
     
     # Invalidate posts cache
-    await redis_client.delete("posts:feed:*")
+    await bump_versions(redis_client, FEED_VERSION_KEY)
     
-    return PostResponse(
+    return PostResponse.model_construct(
         id=str(new_post.id),
         content=new_post.content,
         author_username=current_user.username,
@@ -102,7 +152,8 @@ async def create_post(
 async def get_posts(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[User] = Depends(get_optional_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Get posts in chronological order (newest first).
@@ -111,49 +162,63 @@ async def get_posts(
         skip: Number of posts to skip (for pagination)
         limit: Maximum number of posts to return
         current_user: Optional authenticated user
+        redis_client: Redis client from dependency
         
     Returns:
         List of posts
     """
     # Try to get from cache first (only for first page)
-    redis_client = RedisClient.get_client()
     user_id = str(current_user.id) if current_user else "anonymous"
-    cache_key = f"posts:feed:{user_id}:{skip}:{limit}"
     
     if skip == 0:  # Only cache first page
+        feed_version = int(await redis_client.get(FEED_VERSION_KEY) or 0)
+        cache_key = f"posts:feed:v{feed_version}:{user_id}:{skip}:{limit}"
         cached = await redis_client.get(cache_key)
         if cached:
-            return json.loads(cached)
-    
-    posts = await Post.find_all().sort("-created_at").skip(skip).limit(limit).to_list()
-    
-    response = []
-    for post in posts:
-        # Fetch author information
-        await post.fetch_link(Post.author)
-        author = post.author
-        
-        # Check if current user has liked this post
-        liked_by_user = False
-        if current_user and current_user.id in post.liked_by:
-            liked_by_user = True
-        
-        response.append(PostResponse(
-            id=str(post.id),
-            content=post.content,
-            author_username=author.username,
-            author_id=str(author.id),
-            created_at=post.created_at,
-            updated_at=post.updated_at,
-            likes_count=post.likes_count,
-            comments_count=post.comments_count,
-            image_url=post.image_url,
-            liked_by_user=liked_by_user
-        ))
+            # Cached value is the exact response body
+            return Response(content=cached, media_type="application/json")
+    
+    # Fetch the page joined with its authors in a single pipeline
+    posts = await Post.aggregate([
+        # Leading $sort/$skip/$limit walk the created_at index, so only one
+        # page of posts is read and joined
+        {"$sort": {"created_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "users",
+            "localField": "author.$id",
+            "foreignField": "_id",
+            "as": "author_doc"
+        }},
+        {"$unwind": "$author_doc"},
+        {"$project": {
+            "content": 1,
+            "created_at": 1,
+            "updated_at": 1,
+            "likes_count": 1,
+            "comments_count": 1,
+            "image_url": 1,
+            # Resolved by MongoDB so the liked_by array never leaves the server
+            "liked_by_user": {"$in": [current_user.id if current_user else None, "$liked_by"]},
+            "author_doc._id": 1,
+            "author_doc.username": 1
+        }}
+    ]).to_list()
+    
+    response = [
+        post_response_from_doc(
+            post,
+            post["author_doc"]["username"],
+            post["author_doc"]["_id"],
+            post["liked_by_user"]
+        )
+        for post in posts
+    ]
     
     # Cache first page for 2 minutes
     if skip == 0:
-        await redis_client.setex(cache_key, 120, json.dumps([r.model_dump(mode='json') for r in response]))
+        await redis_client.setex(cache_key, 120, post_list_adapter.dump_json(response))
     
     return response
 
@@ -176,14 +241,7 @@ async def get_post(
     Raises:
         HTTPException: If post not found
     """
-    try:
-        post = await Post.get(PydanticObjectId(post_id))
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
-    
+    post = await Post.get(parse_post_id(post_id))
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -191,15 +249,14 @@ async def get_post(
         )
     
     # Fetch author information
-    await post.fetch_link(Post.author)
-    author = post.author
+    author = await get_author(post.author.ref.id)
     
     # Check if current user has liked this post
     liked_by_user = False
     if current_user and current_user.id in post.liked_by:
         liked_by_user = True
     
-    return PostResponse(
+    return PostResponse.model_construct(
         id=str(post.id),
         content=post.content,
         author_username=author.username,
@@ -217,7 +274,8 @@ async def get_post(
 async def update_post(
     post_id: str,
     post_update: PostUpdate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Update a post (only by the author).
@@ -226,6 +284,7 @@ async def update_post(
         post_id: Post ID
         post_update: Updated post content
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Returns:
         Updated post
@@ -233,24 +292,15 @@ async def update_post(
     Raises:
         HTTPException: If post not found or user is not the author
     """
-    try:
-        post = await Post.get(PydanticObjectId(post_id))
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
-    
+    post = await Post.get(parse_post_id(post_id))
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
     
-    # Fetch author to check ownership
-    await post.fetch_link(Post.author)
-    
-    if post.author.id != current_user.id:
+    # The link already holds the author id, so ownership needs no lookup
+    if post.author.ref.id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to update this post"
@@ -262,17 +312,16 @@ async def update_post(
     await post.save()
     
     # Invalidate posts cache
-    redis_client = RedisClient.get_client()
-    await redis_client.delete("posts:feed:*")
+    await bump_versions(redis_client, FEED_VERSION_KEY)
     
     # Check if current user has liked this post
     liked_by_user = current_user.id in post.liked_by
     
-    return PostResponse(
+    return PostResponse.model_construct(
         id=str(post.id),
         content=post.content,
-        author_username=post.author.username,
-        author_id=str(post.author.id),
+        author_username=current_user.username,
+        author_id=str(current_user.id),
         created_at=post.created_at,
         updated_at=post.updated_at,
         likes_count=post.likes_count,
@@ -285,7 +334,8 @@ async def update_post(
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(
     post_id: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Delete a post (only by the author).
@@ -293,28 +343,20 @@ async def delete_post(
     Args:
         post_id: Post ID
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Raises:
         HTTPException: If post not found or user is not the author
     """
-    try:
-        post = await Post.get(PydanticObjectId(post_id))
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
-    
+    post = await Post.get(parse_post_id(post_id))
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
     
-    # Fetch author to check ownership
-    await post.fetch_link(Post.author)
-    
-    if post.author.id != current_user.id:
+    # The link already holds the author id, so ownership needs no lookup
+    if post.author.ref.id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to delete this post"
@@ -323,14 +365,14 @@ async def delete_post(
     await post.delete()
     
     # Invalidate posts cache
-    redis_client = RedisClient.get_client()
-    await redis_client.delete("posts:feed:*")
+    await bump_versions(redis_client, FEED_VERSION_KEY)
 
 
 @router.post("/{post_id}/like", response_model=PostResponse)
 async def toggle_like(
     post_id: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Toggle like on a post. If user already liked, remove like. If not liked, add like.
@@ -338,6 +380,7 @@ async def toggle_like(
     Args:
         post_id: Post ID
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Returns:
         Updated post with new likes_count
@@ -345,51 +388,40 @@ async def toggle_like(
     Raises:
         HTTPException: If post not found
     """
-    try:
-        post = await Post.get(PydanticObjectId(post_id))
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
+    post_oid = parse_post_id(post_id)
+    user_id = current_user.id
+    posts_collection = Post.get_motor_collection()
+    projection = {"liked_by": 0}
+    
+    # Toggle like with conditional atomic updates, so concurrent likers never
+    # overwrite each other and liked_by is never read into Python
+    post = await posts_collection.find_one_and_update(
+        {"_id": post_oid, "liked_by": user_id},
+        {"$pull": {"liked_by": user_id}, "$inc": {"likes_count": -1}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER
+    )
+    liked_by_user = False
+    
+    if post is None:
+        post = await posts_collection.find_one_and_update(
+            {"_id": post_oid, "liked_by": {"$ne": user_id}},
+            {"$push": {"liked_by": user_id}, "$inc": {"likes_count": 1}},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
         )
+        liked_by_user = True
     
-    if not post:
+    if post is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
     
     # Fetch author information
-    await post.fetch_link(Post.author)
-    author = post.author
-    
-    user_id = current_user.id
-    
-    # Toggle like
-    if user_id in post.liked_by:
-        # Unlike: remove user from liked_by list
-        post.liked_by.remove(user_id)
-        post.likes_count = max(0, post.likes_count - 1)
-    else:
-        # Like: add user to liked_by list
-        post.liked_by.append(user_id)
-        post.likes_count += 1
-    
-    await post.save()
+    author = await get_author(post["author"].id)
     
     # Invalidate posts cache
-    redis_client = RedisClient.get_client()
-    await redis_client.delete("posts:feed:*")
+    await bump_versions(redis_client, FEED_VERSION_KEY)
     
-    return PostResponse(
-        id=str(post.id),
-        content=post.content,
-        author_username=author.username,
-        author_id=str(author.id),
-        created_at=post.created_at,
-        updated_at=post.updated_at,
-        likes_count=post.likes_count,
-        comments_count=post.comments_count,
-        image_url=post.image_url,
-        liked_by_user=user_id in post.liked_by
-    )
+    return post_response_from_doc(post, author.username, author.id, liked_by_user)
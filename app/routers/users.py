@@ -1,34 +1,49 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-import json
-from app.models.user import User
+from fastapi import APIRouter, HTTPException, status, Depends, Response
+import orjson
+from app.models.user import User, ProfileView, days_sober_at
 from app.core.schemas import UserResponse, UserUpdate
-from app.core.dependencies import get_current_active_user
-from app.db.redis import RedisClient
+from app.core.dependencies import get_current_active_user, invalidate_user_snapshots
+from redis.asyncio import Redis
+from app.db.redis import get_redis
 from app.data.drinks import ALCOHOLIC_DRINKS, DRINK_TYPES, CZECH_BEERS
 from datetime import datetime
+from cachetools import TTLCache
 
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
+# The drink lists never change at runtime, so their responses are encoded once
+DRINKS_JSON = orjson.dumps({"drinks": ALCOHOLIC_DRINKS})
+DRINK_TYPES_JSON = orjson.dumps({"types": DRINK_TYPES})
+CZECH_BEERS_JSON = orjson.dumps({"beers": CZECH_BEERS})
+STATIC_CACHE_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
+# Users whose online marker this worker refreshed within the last minute
+ONLINE_MARKER_TTL = 300
+_online_marked = TTLCache(maxsize=100_000, ttl=60)
+
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_profile(
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Get current user's profile.
     
     Args:
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Returns:
         Current user profile
     """
-    # Mark user as online for 5 minutes
-    redis_client = RedisClient.get_client()
-    await redis_client.setex(f"online:{current_user.id}", 300, "1")
+    # Mark user as online for 5 minutes, refreshing at most once a minute
+    if current_user.id not in _online_marked:
+        await redis_client.setex(f"online:{current_user.id}", ONLINE_MARKER_TTL, "1")
+        _online_marked[current_user.id] = True
     
-    return UserResponse(
+    return UserResponse.model_construct(
         id=str(current_user.id),
         username=current_user.username,
         email=current_user.email,
@@ -42,12 +57,16 @@ async def get_current_user_profile(
 
 
 @router.get("/{username}", response_model=UserResponse)
-async def get_user_profile(username: str):
+async def get_user_profile(
+    username: str,
+    redis_client: Redis = Depends(get_redis)
+):
     """
     Get user profile by username.
     
     Args:
         username: Username of the user to retrieve
+        redis_client: Redis client from dependency
         
     Returns:
         User profile
@@ -56,13 +75,12 @@ async def get_user_profile(username: str):
         HTTPException: If user not found
     """
     # Try cache first
-    redis_client = RedisClient.get_client()
     cache_key = f"user:profile:{username}"
     cached = await redis_client.get(cache_key)
     if cached:
-        return json.loads(cached)
+        return orjson.loads(cached)
     
-    user = await User.find_one(User.username == username)
+    user = await User.find_one(User.username == username).project(ProfileView)
     
     if not user:
         raise HTTPException(
@@ -70,20 +88,20 @@ async def get_user_profile(username: str):
             detail="User not found"
         )
     
-    response = UserResponse(
+    response = UserResponse.model_construct(
         id=str(user.id),
         username=user.username,
         email=user.email,
         bio=user.bio,
         favorite_drinks=user.favorite_drinks,
         sober_date=user.sober_date,
-        days_sober=user.days_sober,
+        days_sober=days_sober_at(user.sober_date, datetime.utcnow()),
         created_at=user.created_at,
         is_active=user.is_active
     )
     
     # Cache for 5 minutes
-    await redis_client.setex(cache_key, 300, json.dumps(response.model_dump(mode='json')))
+    await redis_client.setex(cache_key, 300, orjson.dumps(response.model_dump(mode='json')))
     
     return response
 
@@ -91,7 +109,8 @@ async def get_user_profile(username: str):
 @router.put("/me", response_model=UserResponse)
 async def update_user_profile(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    redis_client: Redis = Depends(get_redis)
 ):
     """
     Update current user's profile.
@@ -99,29 +118,24 @@ async def update_user_profile(
     Args:
         user_update: Profile update data
         current_user: Authenticated user from dependency
+        redis_client: Redis client from dependency
         
     Returns:
         Updated user profile
     """
-    # Update fields if provided
-    if user_update.bio is not None:
-        current_user.bio = user_update.bio
-    
-    if user_update.favorite_drinks is not None:
-        current_user.favorite_drinks = user_update.favorite_drinks
-    
-    if user_update.sober_date is not None:
-        current_user.sober_date = user_update.sober_date
-    
-    current_user.updated_at = datetime.utcnow()
+    # Update fields if provided, writing only those fields to MongoDB
+    update_fields = user_update.model_dump(exclude_none=True)
+    update_fields["updated_at"] = datetime.utcnow()
     
-    await current_user.save()
+    await User.find_one(User.id == current_user.id).update({"$set": update_fields})
+    for field, value in update_fields.items():
+        setattr(current_user, field, value)
     
     # Invalidate user cache
-    redis_client = RedisClient.get_client()
     await redis_client.delete(f"user:profile:{current_user.username}")
+    await invalidate_user_snapshots(current_user.username)
     
-    return UserResponse(
+    return UserResponse.model_construct(
         id=str(current_user.id),
         username=current_user.username,
         email=current_user.email,
@@ -142,7 +156,7 @@ async def get_drinks_list():
     Returns:
         List of alcoholic drink names
     """
-    return {"drinks": ALCOHOLIC_DRINKS}
+    return Response(content=DRINKS_JSON, media_type="application/json", headers=STATIC_CACHE_HEADERS)
 
 
 @router.get("/drinks/types")
@@ -153,7 +167,7 @@ async def get_drink_types():
     Returns:
         List of drink types/categories
     """
-    return {"types": DRINK_TYPES}
+    return Response(content=DRINK_TYPES_JSON, media_type="application/json", headers=STATIC_CACHE_HEADERS)
 
 
 @router.get("/drinks/czech-beers")
@@ -164,4 +178,4 @@ async def get_czech_beers():
     Returns:
         List of Czech beer brands
     """
-    return {"beers": CZECH_BEERS}
+    return Response(content=CZECH_BEERS_JSON, media_type="application/json", headers=STATIC_CACHE_HEADERS)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+One-off migration converting Friendship and PrivateMessage user references
+from hex strings to ObjectIds.
+
+Run once from the project root after deploying the ObjectId-typed models:
+
+    python -m scripts.migrate_object_ids
+"""
+
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+
+
+# Collection name -> fields holding user ids
+FIELDS_TO_MIGRATE = {
+    "Friendship": ("user_id", "friend_id"),
+    "PrivateMessage": ("sender_id", "receiver_id"),
+}
+
+
+async def migrate():
+    """Convert string id fields to ObjectIds in place."""
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+    
+    try:
+        for collection, fields in FIELDS_TO_MIGRATE.items():
+            for field in fields:
+                result = await db[collection].update_many(
+                    {field: {"$type": "string"}},
+                    [{"$set": {field: {"$toObjectId": f"${field}"}}}]
+                )
+                print(f"✅ {collection}.{field}: converted {result.modified_count} documents")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
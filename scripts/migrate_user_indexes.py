@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+One-off migration replacing the non-unique users.username / users.email
+indexes with the unique ones registration relies on.
+
+Older deployments created plain `username_1` and `email_1` indexes, which
+block Beanie from creating the unique indexes under the same names. Run
+once from the project root before starting the new version:
+
+    python -m scripts.migrate_user_indexes
+
+The script refuses to continue while duplicate usernames or emails exist;
+resolve those by hand and run it again.
+"""
+
+import asyncio
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+
+
+UNIQUE_FIELDS = ("username", "email")
+
+
+async def migrate() -> int:
+    """Drop non-unique user indexes and create unique ones in their place."""
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    users = client[settings.DATABASE_NAME]["users"]
+    
+    try:
+        # A unique index cannot be built over existing duplicates
+        for field in UNIQUE_FIELDS:
+            duplicates = await users.aggregate([
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": 1}}}
+            ]).to_list(None)
+            if duplicates:
+                values = ", ".join(str(d["_id"]) for d in duplicates)
+                print(f"❌ Duplicate users.{field} values: {values}")
+                return 1
+        
+        index_info = await users.index_information()
+        for field in UNIQUE_FIELDS:
+            name = f"{field}_1"
+            index = index_info.get(name)
+            if index is not None and index.get("unique"):
+                print(f"✅ users.{name} is already unique")
+                continue
+            if index is not None:
+                await users.drop_index(name)
+            await users.create_index(field, name=name, unique=True)
+            print(f"✅ users.{name} recreated as unique")
+    finally:
+        client.close()
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(migrate()))
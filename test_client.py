@@ -18,7 +18,9 @@ class DrinkBuddiesClient:
     def __init__(self, base_url: str = BASE_URL):
         self.base_url = base_url
         self.token = None
-        self.headers = {"Content-Type": "application/json"}
+        # One session keeps the connection alive across calls
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
     
     def register(self, username: str, email: str, password: str, sober_date: str = None):
         """Register a new user."""
@@ -30,9 +32,8 @@ class DrinkBuddiesClient:
         if sober_date:
             data["sober_date"] = sober_date
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/auth/register",
-            headers=self.headers,
             json=data
         )
         return response.json()
@@ -44,25 +45,23 @@ class DrinkBuddiesClient:
             "password": password
         }
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/auth/login/json",
-            headers=self.headers,
             json=data
         )
         
         result = response.json()
         if "access_token" in result:
             self.token = result["access_token"]
-            self.headers["Authorization"] = f"Bearer {self.token}"
+            self.session.headers["Authorization"] = f"Bearer {self.token}"
             print("✅ Login successful!")
         
         return result
     
     def get_profile(self):
         """Get current user's profile."""
-        response = requests.get(
-            f"{self.base_url}/api/users/me",
-            headers=self.headers
+        response = self.session.get(
+            f"{self.base_url}/api/users/me"
         )
         return response.json()
     
@@ -74,9 +73,8 @@ class DrinkBuddiesClient:
         if sober_date:
             data["sober_date"] = sober_date
         
-        response = requests.put(
+        response = self.session.put(
             f"{self.base_url}/api/users/me",
-            headers=self.headers,
             json=data
         )
         return response.json()
@@ -85,26 +83,23 @@ class DrinkBuddiesClient:
         """Create a new post."""
         data = {"content": content}
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/posts/",
-            headers=self.headers,
             json=data
         )
         return response.json()
     
     def get_posts(self, skip: int = 0, limit: int = 20):
         """Get posts from the feed."""
-        response = requests.get(
-            f"{self.base_url}/api/posts/?skip={skip}&limit={limit}",
-            headers=self.headers
+        response = self.session.get(
+            f"{self.base_url}/api/posts/?skip={skip}&limit={limit}"
         )
         return response.json()
     
     def get_messages(self, room: str = "global", limit: int = 50):
         """Get recent chat messages."""
-        response = requests.get(
-            f"{self.base_url}/api/chat/messages?room={room}&limit={limit}",
-            headers=self.headers
+        response = self.session.get(
+            f"{self.base_url}/api/chat/messages?room={room}&limit={limit}"
         )
         return response.json()
 